@@ -36,6 +36,7 @@ class Decoder(graph_utils.NNModel):
         super(Decoder, self).__init__(hyperparameters)
         if self.forward_only:
             self.hyperparams['batch_size'] = 1
+            self.batch_size = 1
 
         self.scope = scope
         self.dim = dim
@@ -51,6 +52,8 @@ class Decoder(graph_utils.NNModel):
         # variable sharing
         self.embedding_vars = False
         self.output_project_vars = False
+        # embedding matrix shared by all buckets
+        self.embedding_matrix = None
 
         self.beam_decoder = beam_search.BeamDecoder(
                 self.num_layers,
@@ -68,6 +71,8 @@ class Decoder(graph_utils.NNModel):
         self.output_project = self.output_project()
 
     def embeddings(self):
+        if self.embedding_matrix is not None:
+            return self.embedding_matrix
         with tf.compat.v1.variable_scope(self.scope + "_embeddings", reuse=self.embedding_vars):
             vocab_size = self.target_vocab_size
             print("target token embedding size = {}".format(vocab_size))
@@ -76,15 +81,24 @@ class Decoder(graph_utils.NNModel):
             embeddings = tf.compat.v1.get_variable("embedding",
                 [vocab_size, self.embedding_dim], initializer=initializer)
             self.embedding_vars = True
+            self.embedding_matrix = embeddings
             return embeddings
 
     def token_features(self):
         return np.load(self.tg_token_features_path)
 
     def output_project(self):
+        if self.tie_embeddings:
+            if self.embedding_dim != self.dim:
+                raise ValueError("Cannot tie target embeddings of dimension {} "
+                                 "to decoder outputs of dimension {}."
+                                 .format(self.embedding_dim, self.dim))
+            # [dim, vocab_size]
+            w = tf.transpose(a=self.embeddings())
         with tf.compat.v1.variable_scope(self.scope + "_output_project",
                                reuse=self.output_project_vars):
-            w = tf.compat.v1.get_variable("proj_w", [self.dim, self.vocab_size])
+            if not self.tie_embeddings:
+                w = tf.compat.v1.get_variable("proj_w", [self.dim, self.vocab_size])
             b = tf.compat.v1.get_variable("proj_b", [self.vocab_size])
             self.output_project_vars = True
         return (w, b)
@@ -24,6 +24,8 @@ class Encoder(graph_utils.NNModel):
         self.char_embedding_vars = False
         self.token_embedding_vars = False
         self.char_rnn_vars = False
+        # embedding matrix shared by all buckets
+        self.token_embedding_matrix = None
 
         self.input_keep = input_keep
         self.output_keep = output_keep
@@ -73,6 +75,8 @@ class Encoder(graph_utils.NNModel):
 
         :return: token embedding matrix [source_vocab_size, dim]
         """
+        if self.token_embedding_matrix is not None:
+            return self.token_embedding_matrix
         with tf.compat.v1.variable_scope("encoder_token_embeddings",
                                reuse=self.token_embedding_vars):
             vocab_size = self.source_vocab_size
@@ -82,6 +86,7 @@ class Encoder(graph_utils.NNModel):
             embeddings = tf.compat.v1.get_variable("embedding",
                 [vocab_size, self.sc_token_dim], initializer=initializer)
             self.token_embedding_vars = True
+            self.token_embedding_matrix = embeddings
             return embeddings
 
     def char_embeddings(self):
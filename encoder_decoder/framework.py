@@ -4,10 +4,6 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
-import sys
-if sys.version_info > (3, 0):
-    from six.moves import xrange
-
 import numpy as np
 
 import tensorflow as tf
@@ -75,42 +71,42 @@ class EncoderDecoderModel(graph_utils.NNModel):
     def define_graph(self):
         self.debug_vars = []
 
-        # Feeds for inputs.
-        self.encoder_inputs = []        # encoder inputs.
-        self.encoder_attn_masks = []    # mask out PAD symbols in the encoder
-        self.decoder_inputs = []        # decoder inputs (always start with "_GO").
-        self.targets = []               # decoder targets
-        self.target_weights = []        # weights at each position of the target sequence.
+        # Feeds for inputs. Each input type is fed as a single
+        # [sequence_length, batch_size] matrix which is split into the
+        # per-step tensors used to build the graph.
+        self.encoder_inputs_placeholder = tf.compat.v1.placeholder(
+            tf.int32, shape=[self.max_source_length, None], name="encoder")
+        self.encoder_attn_masks_placeholder = tf.compat.v1.placeholder(
+            tf.float32, shape=[self.max_source_length, None],
+            name="attn_alignment")
+        self.decoder_inputs_placeholder = tf.compat.v1.placeholder(
+            tf.int32, shape=[self.max_target_length + 1, None], name="decoder")
+        self.target_weights_placeholder = tf.compat.v1.placeholder(
+            tf.float32, shape=[self.max_target_length + 1, None], name="weight")
+
+        # encoder inputs.
+        self.encoder_inputs = tf.unstack(self.encoder_inputs_placeholder)
+        # mask out PAD symbols in the encoder
+        self.encoder_attn_masks = tf.unstack(self.encoder_attn_masks_placeholder)
+        # decoder inputs (always start with "_GO").
+        self.decoder_inputs = tf.unstack(self.decoder_inputs_placeholder)
+        # weights at each position of the target sequence.
+        self.target_weights = tf.unstack(self.target_weights_placeholder)
         self.encoder_copy_inputs = []
 
-        for i in xrange(self.max_source_length):
-            self.encoder_inputs.append(
-                tf.compat.v1.placeholder(
-                    tf.int32, shape=[None], name="encoder{0}".format(i)))
-            self.encoder_attn_masks.append(
-                tf.compat.v1.placeholder(
-                    tf.float32, shape=[None], name="attn_alignment{0}".format(i)))
-
-        for j in xrange(self.max_target_length + 1):
-            self.decoder_inputs.append(
-                tf.compat.v1.placeholder(
-                    tf.int32, shape=[None], name="decoder{0}".format(j)))
-            self.target_weights.append(
-                tf.compat.v1.placeholder(
-                    tf.float32, shape=[None], name="weight{0}".format(j)))
-            # Our targets are decoder inputs shifted by one.
-            if j > 0 and not self.copynet:
-                self.targets.append(self.decoder_inputs[j])
-
         if self.copynet:
-            for i in xrange(self.max_source_length):
-                self.encoder_copy_inputs.append(
-                    tf.compat.v1.placeholder(
-                        tf.int32, shape=[None], name="encoder_copy{0}".format(i)))
-            for j in xrange(self.max_target_length):
-                self.targets.append(
-                    tf.compat.v1.placeholder(
-                        tf.int32, shape=[None], name="copy_target{0}".format(i)))
+            self.encoder_copy_inputs_placeholder = tf.compat.v1.placeholder(
+                tf.int32, shape=[self.max_source_length, None],
+                name="encoder_copy")
+            self.copy_targets_placeholder = tf.compat.v1.placeholder(
+                tf.int32, shape=[self.max_target_length, None],
+                name="copy_target")
+            self.encoder_copy_inputs = \
+                tf.unstack(self.encoder_copy_inputs_placeholder)
+            self.targets = tf.unstack(self.copy_targets_placeholder)
+        else:
+            # Our targets are decoder inputs shifted by one.
+            self.targets = self.decoder_inputs[1:]
 
         # Compute training outputs and losses in the forward direction.
         if self.buckets:
@@ -220,6 +216,10 @@ class EncoderDecoderModel(graph_utils.NNModel):
                 self.gradient_norms = norm
                 self.updates = opt.apply_gradients(zip(clipped_gradients, params))
 
+        # Snapshot the graph collections once, they do not change after
+        # the graph is built.
+        self.extra_update_ops = tf.compat.v1.get_collection(
+            tf.compat.v1.GraphKeys.UPDATE_OPS)
         self.saver = tf.compat.v1.train.Saver(tf.compat.v1.global_variables())
 
 
@@ -240,9 +240,8 @@ class EncoderDecoderModel(graph_utils.NNModel):
 
         # --- Decode Step --- #
         if self.tg_token_use_attention:
-            attention_states = tf.concat(
-                [tf.reshape(m, [-1, 1, self.encoder.output_dim])
-                 for m in encoder_outputs], axis=1)
+            # [batch_size, encoder_size, encoder.output_dim]
+            attention_states = tf.stack(encoder_outputs, axis=1)
         else:
             attention_states = None
         num_heads = 2 if (self.tg_token_use_attention and self.copynet) else 1
@@ -302,10 +301,7 @@ class EncoderDecoderModel(graph_utils.NNModel):
                         char_decoder_init_state, char_decoder_inputs)
                 encoder_decoder_char_loss = self.sequence_loss(
                     char_output_logits, char_targets, char_target_weights,
-                    graph_utils.softmax_loss(
-                        self.char_decoder.output_project,
-                        self.tg_char_vocab_size / 2,
-                        self.tg_char_vocab_size))
+                    self.char_loss_function)
             else:
                 encoder_decoder_char_loss = 0
 
@@ -316,9 +312,7 @@ class EncoderDecoderModel(graph_utils.NNModel):
             losses = tf.zeros_like(decoder_inputs[0])
 
         # --- Store encoder/decoder output states --- #
-        encoder_hidden_states = tf.concat(
-            axis=1, values=[tf.reshape(e_o, [-1, 1, self.encoder.output_dim])
-                            for e_o in encoder_outputs])
+        encoder_hidden_states = tf.stack(encoder_outputs, axis=1)
         
         top_states = []
         if self.rnn_cell == 'gru':
@@ -330,9 +324,7 @@ class EncoderDecoderModel(graph_utils.NNModel):
                     top_states.append(state[-1][1])
                 else:
                     top_states.append(state[1])
-        decoder_hidden_states = tf.concat(axis=1,
-            values=[tf.reshape(d_o, [-1, 1, self.decoder.dim])
-                    for d_o in top_states])
+        decoder_hidden_states = tf.stack(top_states, axis=1)
 
         O = {}
         O['output_symbols'] = output_symbols
@@ -353,12 +345,16 @@ class EncoderDecoderModel(graph_utils.NNModel):
     def sequence_loss(self, logits, targets, target_weights, loss_function):
         assert(len(logits) == len(targets))
         with tf.compat.v1.variable_scope("sequence_loss"):
-            log_perp_list = []
-            for logit, target, weight in zip(logits, targets, target_weights):
-                crossent = loss_function(logit, target)
-                log_perp_list.append(crossent * weight)
-            log_perps = tf.add_n(log_perp_list)
-            total_size = tf.add_n(target_weights)
+            # [sequence_length, batch_size]
+            targets = tf.stack(targets)
+            target_weights = tf.stack(target_weights)
+            # Evaluate the loss function on all steps at once.
+            crossent = loss_function(
+                tf.concat(logits, axis=0), tf.reshape(targets, [-1]))
+            crossent = tf.reshape(crossent, tf.shape(input=targets))
+            log_perps = tf.reduce_sum(
+                input_tensor=crossent * target_weights, axis=0)
+            total_size = tf.reduce_sum(input_tensor=target_weights, axis=0)
             log_perps /= total_size
 
         avg_log_perps = tf.reduce_mean(input_tensor=log_perps)
@@ -399,6 +395,12 @@ class EncoderDecoderModel(graph_utils.NNModel):
         else:
             raise ValueError("Unrecognized target character composition: {}."
                              .format(self.tg_char_composition))
+        # The loss function (and the transposed output projection used by the
+        # sampled softmax) is created once and shared by all buckets.
+        self.char_loss_function = graph_utils.softmax_loss(
+            self.char_decoder.output_project,
+            self.tg_char_vocab_size // 2,
+            self.tg_char_vocab_size)
 
     # --- Graph Operations --- #
 
@@ -416,20 +418,20 @@ class EncoderDecoderModel(graph_utils.NNModel):
         def load_channel(inputs, output_length, reversed_output=True):
             """
             Convert a batch of feature vectors into a batched feature vector.
+            :return: int32 matrix of shape [output_length, batch_size]
             """
-            padded_inputs = []
-            batch_inputs = []
-            for batch_idx in xrange(batch_size):
-                input = inputs[batch_idx]
-                paddings = [data_utils.PAD_ID] * (output_length - len(input))
+            batch_inputs = np.full([output_length, len(inputs)],
+                                   data_utils.PAD_ID, dtype=np.int32)
+            for batch_idx, input in enumerate(inputs):
                 if reversed_output:
-                    padded_inputs.append(list(reversed(input + paddings)))
+                    # keep the tail of the sequence, which is read first
+                    input = input[max(len(input) - output_length, 0):]
                 else:
-                    padded_inputs.append(input + paddings)
-            for length_idx in xrange(output_length):
-                batched_dim = np.array([padded_inputs[batch_idx][length_idx]
-                        for batch_idx in xrange(batch_size)], dtype=np.int32)
-                batch_inputs.append(batched_dim)
+                    input = input[:output_length]
+                batch_inputs[:len(input), batch_idx] = input
+            if reversed_output:
+                # row-reversed view, no copy is made
+                batch_inputs = batch_inputs[::-1]
             return batch_inputs
 
         if bucket_id != -1:
@@ -440,46 +442,26 @@ class EncoderDecoderModel(graph_utils.NNModel):
         batch_size = len(encoder_input_channels[0])
 
         # create batch-major vectors
-        batch_encoder_inputs = load_channel(
+        E = Example()
+        E.encoder_inputs = load_channel(
             encoder_input_channels[0], encoder_size, reversed_output=True)
-        batch_decoder_inputs = load_channel(
+        E.decoder_inputs = load_channel(
             decoder_input_channels[0], decoder_size, reversed_output=False)
         if self.copynet:
-            batch_encoder_copy_inputs = load_channel(
+            E.encoder_copy_inputs = load_channel(
                 encoder_input_channels[1], encoder_size, reversed_output=True)
-            batch_copy_targets = load_channel(
+            E.copy_targets = load_channel(
                 decoder_input_channels[1], decoder_size, reversed_output=False)
 
-        batch_encoder_input_masks = []
-        batch_decoder_input_masks = []
-        for length_idx in xrange(encoder_size):
-            batch_encoder_input_mask = np.ones(batch_size, dtype=np.float32)
-            for batch_idx in xrange(batch_size):
-                source = batch_encoder_inputs[length_idx][batch_idx]
-                if source == data_utils.PAD_ID:
-                    batch_encoder_input_mask[batch_idx] = 0.0
-            batch_encoder_input_masks.append(batch_encoder_input_mask)
-
-        for length_idx in xrange(decoder_size):
-            # Create target_weights to be 0 for targets that are padding.
-            batch_decoder_input_mask = np.ones(batch_size, dtype=np.float32)
-            for batch_idx in xrange(batch_size):
-                # We set weight to 0 if the corresponding target is a PAD symbol.
-                # The corresponding target is decoder_input shifted by 1 forward.
-                if length_idx < decoder_size - 1:
-                    target = batch_decoder_inputs[length_idx+1][batch_idx]
-                if length_idx == decoder_size - 1 or target == data_utils.PAD_ID:
-                    batch_decoder_input_mask[batch_idx] = 0.0
-            batch_decoder_input_masks.append(batch_decoder_input_mask)
+        # Mask out the PAD symbols in the encoder inputs.
+        E.encoder_attn_masks = \
+            (E.encoder_inputs != data_utils.PAD_ID).astype(np.float32)
 
-        E = Example()
-        E.encoder_inputs = batch_encoder_inputs
-        E.encoder_attn_masks = batch_encoder_input_masks
-        E.decoder_inputs = batch_decoder_inputs
-        E.target_weights = batch_decoder_input_masks
-        if self.use_copy:
-            E.encoder_copy_inputs = batch_encoder_copy_inputs
-            E.copy_targets = batch_copy_targets
+        # Create target_weights to be 0 for targets that are padding.
+        # The corresponding target is decoder_input shifted by 1 forward, and
+        # the last decoder input has no target.
+        E.target_weights = np.zeros([decoder_size, batch_size], dtype=np.float32)
+        E.target_weights[:-1] = E.decoder_inputs[1:] != data_utils.PAD_ID
 
         return E
 
@@ -490,32 +472,24 @@ class EncoderDecoderModel(graph_utils.NNModel):
         convert the feature vectors into the dimensions required by the neural
         network.
         """
-        encoder_inputs, decoder_inputs = [], []
-        if self.copynet:
-            encoder_copy_inputs, copy_targets = [], []
-
         if bucket_id == -1:
             sample_pool = data
         else:
             sample_pool = data[bucket_id]
 
         # Randomly sample a batch of encoder and decoder inputs from data
-        data_ids = list(xrange(len(sample_pool)))
-        if not use_all:
-            data_ids = np.random.choice(data_ids, self.batch_size)
-        for i in data_ids:
-            data_point = sample_pool[i]
-            encoder_inputs.append(data_point.sc_ids)
-            decoder_inputs.append(data_point.tg_ids)
-            if self.copynet:
-                encoder_copy_inputs.append(data_point.csc_ids)
-                copy_targets.append(data_point.ctg_ids)
-
-        encoder_input_channels = [encoder_inputs]
-        decoder_input_channels = [decoder_inputs]
+        if use_all:
+            data_points = sample_pool
+        else:
+            data_ids = np.random.randint(
+                0, len(sample_pool), size=self.batch_size)
+            data_points = [sample_pool[i] for i in data_ids]
+
+        encoder_input_channels = [[dp.sc_ids for dp in data_points]]
+        decoder_input_channels = [[dp.tg_ids for dp in data_points]]
         if self.copynet:
-            encoder_input_channels.append(encoder_copy_inputs)
-            decoder_input_channels.append(copy_targets)
+            encoder_input_channels.append([dp.csc_ids for dp in data_points])
+            decoder_input_channels.append([dp.ctg_ids for dp in data_points])
 
         return self.format_batch(
             encoder_input_channels, decoder_input_channels, bucket_id=bucket_id)
@@ -525,42 +499,40 @@ class EncoderDecoderModel(graph_utils.NNModel):
         """
         Assign the data vectors to the corresponding neural network variables.
         """
-        encoder_size, decoder_size = len(E.encoder_inputs), len(E.decoder_inputs)
-        input_feed = {}
-        for l in xrange(encoder_size):
-            input_feed[self.encoder_inputs[l].name] = E.encoder_inputs[l]
-            input_feed[self.encoder_attn_masks[l].name] = E.encoder_attn_masks[l]
-        for l in xrange(decoder_size):
-            input_feed[self.decoder_inputs[l].name] = E.decoder_inputs[l]
-            input_feed[self.target_weights[l].name] = E.target_weights[l]
+        decoder_size = len(E.decoder_inputs)
+        input_feed = {
+            self.encoder_inputs_placeholder: self.pad_input(
+                E.encoder_inputs, self.max_source_length),
+            self.encoder_attn_masks_placeholder: self.pad_input(
+                E.encoder_attn_masks, self.max_source_length),
+            self.decoder_inputs_placeholder: self.pad_input(
+                E.decoder_inputs, self.max_target_length + 1),
+            self.target_weights_placeholder: self.pad_input(
+                E.target_weights, self.max_target_length + 1)
+        }
         if self.copynet:
-            for l in xrange(encoder_size):
-                input_feed[self.encoder_copy_inputs[l].name] = \
-                    E.encoder_copy_inputs[l]
-            for l in xrange(decoder_size-1):
-                input_feed[self.targets[l].name] = E.copy_targets[l]
-
-        # Apply dummy values to encoder and decoder inputs
-        for l in xrange(encoder_size, self.max_source_length):
-            input_feed[self.encoder_inputs[l].name] = np.zeros(
-                E.encoder_inputs[-1].shape, dtype=np.int32)
-            input_feed[self.encoder_attn_masks[l].name] = np.zeros(
-                E.encoder_attn_masks[-1].shape, dtype=np.int32)
-            if self.copynet:
-                input_feed[self.encoder_copy_inputs[l].name] = \
-                    np.zeros(E.encoder_copy_inputs[-1].shape, dtype=np.int32)
-        for l in xrange(decoder_size, self.max_target_length + 1):
-            input_feed[self.decoder_inputs[l].name] = np.zeros(
-                E.decoder_inputs[-1].shape, dtype=np.int32)
-            input_feed[self.target_weights[l].name] = np.zeros(
-                E.target_weights[-1].shape, dtype=np.int32)
-            if self.copynet:
-                input_feed[self.targets[l-1].name] = np.zeros(
-                    E.copy_targets[-1].shape, dtype=np.int32)
-        
+            input_feed[self.encoder_copy_inputs_placeholder] = self.pad_input(
+                E.encoder_copy_inputs, self.max_source_length)
+            input_feed[self.copy_targets_placeholder] = self.pad_input(
+                E.copy_targets[:decoder_size-1], self.max_target_length)
+
         return input_feed
 
 
+    def pad_input(self, batch_input, length):
+        """
+        Apply dummy values to the steps of a [sequence_length, batch_size]
+        input matrix which are beyond the bucket, so that it matches the
+        shape of the input placeholder.
+        """
+        if len(batch_input) == length:
+            return batch_input
+        padded_input = np.zeros([length, batch_input.shape[1]],
+                                dtype=batch_input.dtype)
+        padded_input[:len(batch_input)] = batch_input
+        return padded_input
+
+
     def step(self, session, formatted_example, bucket_id=-1, forward_only=False):
         """Run a step of the model feeding the given inputs.
         :param session: tensorflow session to use.
@@ -623,10 +595,9 @@ class EncoderDecoderModel(graph_utils.NNModel):
         if self.use_copy:
             output_feed['pointers'] = self.pointers
 
-        extra_update_ops = tf.compat.v1.get_collection(tf.compat.v1.GraphKeys.UPDATE_OPS)
-        if extra_update_ops and not forward_only:
+        if self.extra_update_ops and not forward_only:
             outputs, extra_updates = session.run(
-                [output_feed, extra_update_ops], input_feed)
+                [output_feed, self.extra_update_ops], input_feed)
         else:
             outputs = session.run(output_feed, input_feed)
 
@@ -656,6 +627,8 @@ class EncoderDecoderModel(graph_utils.NNModel):
 class Example(object):
     """
     Input data to the neural network (batched when mini-batch training is used).
+    Each field is a [sequence_length, batch_size] matrix whose rows are fed to
+    the placeholders of the corresponding time steps.
     """
     def __init__(self):
         self.encoder_inputs = None
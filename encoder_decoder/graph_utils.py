@@ -54,6 +54,7 @@ def define_model(FLAGS, session, model_constructor, buckets, forward_only):
 
     params["tg_token"] = FLAGS.tg_token
     params["tg_char"] = FLAGS.tg_char
+    params["tie_embeddings"] = FLAGS.tie_embeddings
     # params["tg_char_vocab_size"] = FLAGS.tg_char_vocab_size
     # params["tg_char_composition"] = FLAGS.tg_char_composition
     # params["tg_char_use_attention"] = FLAGS.tg_char_use_attention
@@ -203,6 +204,8 @@ def get_decode_signature(FLAGS):
     if FLAGS.use_copy:
         model_subdir += '-copy'
         model_subdir += '-{:.1f}'.format(FLAGS.chi)
+    if FLAGS.tie_embeddings:
+        model_subdir += '-tied'
     model_subdir += '-{}'.format(FLAGS.batch_size)
     if FLAGS.sc_token:
         model_subdir += '-{}'.format(FLAGS.sc_token_dim)
@@ -270,7 +273,13 @@ def wrap_inputs(beam_decoder, inputs):
 
 
 def sparse_cross_entropy(logits, targets):
-    return -tf.reduce_sum(input_tensor=logits * tf.one_hot(targets, logits.get_shape()[1]), axis=1)
+    """
+    Negative log-likelihood of the targets given log-probabilities.
+
+    :param logits: [batch_size, vocab_size] log-probabilities.
+    :param targets: [batch_size] target indices.
+    """
+    return -tf.gather(params=logits, indices=targets, batch_dims=1)
 
 
 def nest_map(func, nested):
@@ -663,6 +672,17 @@ class NNModel(object):
         self.hyperparams = hyperparams
         self.buckets = buckets
 
+        # Hyperparameters read on every step are stored as plain attributes
+        # to save a property call and a dictionary lookup per access.
+        self.batch_size = hyperparams["batch_size"]
+        self.num_samples = hyperparams["num_samples"]
+        self.source_vocab_size = hyperparams["source_vocab_size"]
+        self.target_vocab_size = hyperparams["target_vocab_size"]
+        self.max_source_length = hyperparams["max_source_length"]
+        self.max_target_length = hyperparams["max_target_length"]
+        self.tg_token_use_attention = hyperparams["tg_token_use_attention"]
+        self.use_copy = hyperparams["use_copy"]
+
     # --- model architecture hyperparameters --- #
 
     @property
@@ -688,14 +708,6 @@ class NNModel(object):
         return self.num_samples > 0 and \
                self.num_samples < self.target_vocab_size
 
-    @property
-    def num_samples(self):
-        return self.hyperparams["num_samples"]
-
-    @property
-    def batch_size(self):
-        return self.hyperparams["batch_size"]
-
     @property
     def num_epochs(self):
         return self.hyperparams["num_epochs"]
@@ -720,10 +732,6 @@ class NNModel(object):
     def adam_epsilon(self):
         return self.hyperparams["adam_epsilon"]
 
-    @property
-    def tg_token_use_attention(self):
-        return self.hyperparams["tg_token_use_attention"]
-
     @property
     def tg_token_attn_fun(self):
         return self.hyperparams["tg_token_attn_fun"]
@@ -769,22 +777,6 @@ class NNModel(object):
         return self.hyperparams["beta_x"]
 
 
-    @property
-    def source_vocab_size(self):
-        return self.hyperparams["source_vocab_size"]
-
-    @property
-    def target_vocab_size(self):
-        return self.hyperparams["target_vocab_size"]
-
-    @property
-    def max_source_length(self):
-        return self.hyperparams["max_source_length"]
-
-    @property
-    def max_target_length(self):
-        return self.hyperparams["max_target_length"]
-
     @property
     def max_source_token_size(self):
         return self.hyperparams["max_source_token_size"]
@@ -871,6 +863,11 @@ class NNModel(object):
     def tg_char(self):
         return self.hyperparams["tg_char"]
 
+    @property
+    def tie_embeddings(self):
+        # If set, the output projection is the transposed target embeddings.
+        return self.hyperparams["tie_embeddings"]
+
     @property
     def tg_char_vocab_size(self):
         return self.hyperparams["tg_char_vocab_size"]
@@ -909,10 +906,6 @@ class NNModel(object):
 
     # -- copy mechanism -- #
 
-    @property
-    def use_copy(self):
-        return self.hyperparams["use_copy"]
-
     @property
     def copy_fun(self):
         return self.hyperparams["copy_fun"]
@@ -189,6 +189,8 @@ def define_input_flags():
     tf.compat.v1.flags.DEFINE_boolean('tg_token', True,
                                 'Set to True to turn on the token channel in the decoder. On by default.')
     tf.compat.v1.flags.DEFINE_integer('tg_token_embedding_size', 1000, 'target word embedding size.')
+    tf.compat.v1.flags.DEFINE_boolean('tie_embeddings', False,
+                                'Set to True to share the target token embeddings with the output projection.')
     tf.compat.v1.flags.DEFINE_boolean('tg_char', False,
                                 'Set to True to turn on character RNN extention module in the decoder.')
     tf.compat.v1.flags.DEFINE_string('tg_char_composition', 'rnn',
@@ -79,6 +79,7 @@ class RNNDecoder(decoder.Decoder):
                 state = encoder_state
                 past_output_symbols = []
                 past_output_logits = []
+                step_outputs = []
 
             if self.use_attention:
                 if bs_decoding:
@@ -127,6 +128,23 @@ class RNNDecoder(decoder.Decoder):
                 past_output_logits.append(output_logits)
                 return output_symbol, output_logits
 
+            def batch_output_symbols_and_logits(outputs):
+                # Project the outputs of all steps with a single matmul.
+                epsilon = tf.constant(1e-12)
+                # [len(outputs)*batch_size, dim]
+                flat_outputs = tf.concat(outputs, axis=0)
+                if self.copynet:
+                    flat_logits = tf.math.log(flat_outputs + epsilon)
+                else:
+                    W, b = self.output_project
+                    flat_logits = tf.math.log(tf.nn.softmax(
+                        tf.nn.bias_add(tf.matmul(flat_outputs, W), b)) + epsilon)
+                flat_symbols = tf.argmax(input=flat_logits, axis=1)
+                past_output_symbols.extend(
+                    tf.split(flat_symbols, len(outputs), axis=0))
+                past_output_logits.extend(
+                    tf.split(flat_logits, len(outputs), axis=0))
+
             for i, input in enumerate(decoder_inputs):
                 if bs_decoding:
                     input = beam_decoder.wrap_input(input)
@@ -145,8 +163,6 @@ class RNNDecoder(decoder.Decoder):
                             output_symbol, _ = step_output_symbol_and_logit(output)
                             if not self.force_reading_input:
                                 input = tf.cast(output_symbol, dtype=tf.int32)
-                    else:
-                        step_output_symbol_and_logit(output)
                     if self.copynet:
                         decoder_input = input
                         input = tf.compat.v1.where(input >= self.target_vocab_size,
@@ -207,6 +223,8 @@ class RNNDecoder(decoder.Decoder):
                     # step cannot simply be gathered step-wise outside the decoder
                     # (speical case: beam_size = 1)
                     states.append(state)
+                    if not self.forward_only:
+                        step_outputs.append(output)
 
             if self.use_attention:
                 # Tensor list --> tenosr
@@ -278,11 +296,18 @@ class RNNDecoder(decoder.Decoder):
                        states, attn_alignments, pointers
             else:
                 # Greedy output
-                step_output_symbol_and_logit(output)
+                if self.forward_only:
+                    step_output_symbol_and_logit(output)
+                else:
+                    # The ground truth inputs are fed at training time, so
+                    # the outputs can be projected after the unrolling.
+                    batch_output_symbols_and_logits(step_outputs)
                 output_symbols = tf.concat(
                     [tf.expand_dims(x, 1) for x in past_output_symbols], axis=1)
-                sequence_logits = tf.add_n([tf.reduce_max(input_tensor=x, axis=1) 
-                                            for x in past_output_logits])
+                # [len(decoder_inputs), batch_size, vocab_size]
+                stacked_output_logits = tf.stack(past_output_logits)
+                sequence_logits = tf.reduce_sum(input_tensor=tf.reduce_max(
+                    input_tensor=stacked_output_logits, axis=2), axis=0)
                 return output_symbols, sequence_logits, past_output_logits, \
                        states, attn_alignments, pointers
 